@@ -1,7 +1,8 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.core.backpressure import scraper_controller
 from app.models.billingmodels import Credentials
-from app.workers.job_handler import run_scraper_job
-from app.services.storageservice import StorageService
+from app.workers.job_handler import run_scraper_job, job_queue_full
+from app.services.storageservice import StorageService, get_storage_service
 from app.utils.redis_helper import set_job_status, get_job_status
 import logging
 from app.middleware.rate_limiter import limiter  # Import the limiter
@@ -13,7 +14,8 @@ logger = logging.getLogger(__name__)
 
 @router.post("/billing/retrieve", status_code=status.HTTP_202_ACCEPTED)
 @limiter.limit("5/minute")  # Limit to 5 requests per minute
-async def retrieve_billing_data(credentials: Credentials, background_tasks: BackgroundTasks):
+async def retrieve_billing_data(credentials: Credentials,
+                                storage_service: StorageService = Depends(get_storage_service)):
     """
     Starts the billing data retrieval job, uploads downloaded data to AWS S3, and returns the job status.
 
@@ -23,32 +25,41 @@ async def retrieve_billing_data(credentials: Credentials, background_tasks: Back
     Returns:
         A JSON response containing the job ID, initial status ("downloading"), and uploaded files.
     """
+    # Fail fast while the upstream browser provider is throttling us
+    if scraper_controller.breaker_open:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Scraper temporarily unavailable; please retry shortly.",
+        )
+
+    # Shed load instead of queuing unboundedly when the worker pool is saturated
+    if job_queue_full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Job queue is full; please retry shortly.",
+        )
+
     try:
         logger.info("Starting billing data retrieval job.")
-        
-        # Start the download process
-        job_id = await run_scraper_job(credentials, background_tasks)
+
+        # Enqueue the job for the worker pool
+        job_id = await run_scraper_job(credentials)
         if not job_id:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Data download failed")
 
-        # Set job status to 'downloading' initially in Redis
+        # Set job status to 'downloading' initially in Redis; the StorageService
+        # singleton is injected, so no per-request construction remains to overlap
         await set_job_status(job_id, "downloading")
         logger.info(f"Job {job_id} started with status 'downloading'.")
 
-        # Initialize the StorageService to handle AWS S3 upload
-        storage_service = StorageService()
-
-        # Update job status to 'uploading' before the upload process begins
-        await set_job_status(job_id, "uploading")
-        logger.info(f"Job {job_id} status updated to 'uploading'.")
-
         # Upload all files in the download directory to AWS S3
         uploaded_files = await storage_service.upload_files(job_id)
         if not uploaded_files:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="AWS upload failed")
 
-        # Mark job status as 'completed' after successful upload
-        await set_job_status(job_id, "completed")
+        # Mark job status as 'completed' in a single write; the TTL lets finished
+        # jobs expire from Redis without a separate cleanup pass
+        await set_job_status(job_id, "completed", ex=3600)
         logger.info(f"Job {job_id} completed with {len(uploaded_files)} files uploaded to S3.")
 
         return {"job_id": job_id, "status": "completed", "uploaded_files": uploaded_files}
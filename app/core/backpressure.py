@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class AIMDController:
+    """
+    Additive-increase/multiplicative-decrease admission controller for scraper jobs.
+
+    The concurrency limit grows by `alpha` after each healthy completion and is
+    cut by `beta` on errors or when the rolling mean latency exceeds the target,
+    keeping average session latency near `latency_target` without collapsing
+    under overload. A circuit breaker opens for `breaker_reset` seconds after
+    `breaker_threshold` consecutive throttled (429) completions so callers can
+    fail fast instead of piling onto a struggling upstream.
+    """
+
+    def __init__(self, c_min: int = 1, c_max: int = 8, alpha: float = 0.5, beta: float = 0.5,
+                 latency_target: float = 300.0, window: int = 16,
+                 breaker_threshold: int = 3, breaker_reset: float = 30.0):
+        self.c_min = c_min
+        self.c_max = c_max
+        self.alpha = alpha
+        self.beta = beta
+        self.latency_target = latency_target
+        self.latencies = deque(maxlen=window)
+        self.limit = float(c_max)
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+        self._consecutive_throttles = 0
+        self._breaker_opened_at = 0.0
+
+    @property
+    def breaker_open(self) -> bool:
+        """True while the circuit breaker is tripped."""
+        if not self._breaker_opened_at:
+            return False
+        return time.monotonic() - self._breaker_opened_at < self.breaker_reset
+
+    async def acquire(self):
+        """Waits for an admission slot under the current concurrency limit."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+
+    async def release(self, latency: float = None, success: bool = True, throttled: bool = False):
+        """Releases a slot and adjusts the limit from the completion outcome."""
+        async with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self._consecutive_throttles += 1
+                if self._consecutive_throttles >= self.breaker_threshold:
+                    self._breaker_opened_at = time.monotonic()
+                    logger.warning(f"Circuit breaker opened for {self.breaker_reset}s after "
+                                   f"{self._consecutive_throttles} consecutive throttled jobs.")
+                self.limit = max(self.c_min, self.limit * self.beta)
+            elif not success:
+                self._consecutive_throttles = 0
+                self.limit = max(self.c_min, self.limit * self.beta)
+            else:
+                self._consecutive_throttles = 0
+                self._breaker_opened_at = 0.0
+                if latency is not None:
+                    self.latencies.append(latency)
+                mean_latency = sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+                if mean_latency <= self.latency_target:
+                    self.limit = min(self.c_max, self.limit + self.alpha)
+                else:
+                    self.limit = max(self.c_min, self.limit * self.beta)
+            self._condition.notify_all()
+
+# Process-wide controller gating the Playwright scraper
+scraper_controller = AIMDController()
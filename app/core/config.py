@@ -1,13 +1,25 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
+def _bool(value, default=False):
+    """Parses an env-style boolean ('1', 'true', 'yes', 'on'); bool() on a string is a trap."""
+    if value is None:
+        return default
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
 class Config:
     USERNAME = os.getenv("USERNAME", "default_user")
     PASSWORD = os.getenv("PASSWORD", "default_pass")
     MAX_PAGES = int(os.getenv("MAX_PAGES", 50))
     API_KEY = os.getenv("API_KEY", "default_api_key")
-    DEBUG = bool(os.getenv("DEBUG", True))
+    DEBUG = _bool(os.getenv("DEBUG"), False)
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Returns the cached Config instance for dependency-injected reads."""
+    return Config()
 
-config = Config()
+config = get_config()
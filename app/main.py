@@ -1,6 +1,21 @@
+try:
+    import uvloop
+    uvloop.install()  # C event loop; big per-op latency win for async redis/boto
+except ImportError:
+    uvloop = None
+
+from app.utils.logging_helper import setup_logging, shutdown_logging
+
+# Configure queue-based logging before application modules set up their loggers
+setup_logging()
+
 from fastapi import FastAPI
 from app.api.routes import router  # Importing API router
 from app.middleware.rate_limiter import init_app
+from app.services.storageservice import StorageService
+from app.utils.redis_helper import get_redis_client, close_redis_pool
+from app.workers.job_handler import close_http_session, start_job_workers, stop_job_workers
+from app.workers.webhook_dispatcher import start_webhook_dispatcher, stop_webhook_dispatcher
 
 # Initialize the FastAPI application
 app = FastAPI()
@@ -9,6 +24,29 @@ init_app(app)
 # Include the router from api/routes.py
 app.include_router(router)
 
+@app.on_event("startup")
+async def startup_event():
+    # Create the Redis connection pool once and share it via app state
+    app.state.redis = await get_redis_client()
+    # One StorageService with a persistent S3 client for the app lifetime,
+    # pre-warmed so the first request doesn't pay the model-load/TLS tax
+    app.state.storage = StorageService()
+    await app.state.storage.open()
+    await app.state.storage.warm()
+    # Bounded queue + worker pool for scraper jobs
+    await start_job_workers()
+    # Outbox consumer delivering webhook notifications
+    await start_webhook_dispatcher()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_webhook_dispatcher()
+    await stop_job_workers()
+    await app.state.storage.close()
+    await close_http_session()
+    await close_redis_pool()
+    shutdown_logging()
+
 # Basic health check endpoint 
 @app.get("/health")
 async def health_check():
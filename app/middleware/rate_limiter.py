@@ -1,9 +1,88 @@
-from slowapi import Limiter
-from slowapi.errors import RateLimitExceeded
+import functools
+import inspect
+import logging
+import time
+import uuid
 from fastapi import Request, FastAPI
-from slowapi.util import get_remote_address
+from fastapi.responses import JSONResponse
 
-limiter = Limiter(key_func=get_remote_address)
+from app.utils.redis_helper import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Window lengths in seconds for the "N/period" limit strings used on routes
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__("Rate limit exceeded")
+
+def get_remote_address(request: Request) -> str:
+    """Returns the client IP address for rate-limit keying."""
+    return request.client.host if request.client else "127.0.0.1"
+
+def parse_limit(limit_string: str):
+    """Parses a limit string like '5/minute' into (max_requests, window_seconds)."""
+    count, _, period = limit_string.partition("/")
+    return int(count), PERIODS[period.strip()]
+
+class SlidingWindowLimiter:
+    """
+    Redis-backed sliding-window rate limiter shared across all uvicorn workers.
+
+    Each key holds a sorted set of request timestamps; pruning, counting, and
+    inserting happen in one pipelined round trip, so counting is exact over the
+    window with no fixed-window boundary bursts.
+    """
+
+    def __init__(self, key_func=get_remote_address):
+        self.key_func = key_func
+
+    async def check(self, request: Request, scope: str, max_requests: int, window: int):
+        key = f"ratelimit:{scope}:{self.key_func(request)}"
+        now = time.time()
+        try:
+            redis = await get_redis_client()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.zremrangebyscore(key, 0, now - window)
+                pipe.zadd(key, {uuid.uuid4().hex: now})
+                pipe.zcard(key)
+                pipe.expire(key, window)
+                _, _, count, _ = await pipe.execute()
+        except Exception as e:
+            # Fail open: a Redis outage should not take the API down with it
+            logger.error(f"Rate limiter unavailable for {key}: {e}")
+            return
+        if count > max_requests:
+            raise RateLimitExceeded(retry_after=window)
+
+    def limit(self, limit_string: str):
+        """Decorator applying a sliding-window limit (e.g. '5/minute') to an endpoint."""
+        max_requests, window = parse_limit(limit_string)
+
+        def decorator(func):
+            signature = inspect.signature(func)
+            takes_request = "request" in signature.parameters
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request") if takes_request else kwargs.pop("request")
+                await self.check(request, func.__name__, max_requests, window)
+                return await func(*args, **kwargs)
+
+            if not takes_request:
+                # Expose a request parameter so FastAPI injects it for the check
+                params = list(signature.parameters.values())
+                params.append(inspect.Parameter(
+                    "request", inspect.Parameter.KEYWORD_ONLY, annotation=Request
+                ))
+                wrapper.__signature__ = signature.replace(parameters=params)
+            return wrapper
+
+        return decorator
+
+limiter = SlidingWindowLimiter(key_func=get_remote_address)
 
 def init_app(app: FastAPI):
     app.state.limiter = limiter
@@ -13,4 +92,8 @@ def init_app(app: FastAPI):
         return JSONResponse(
             status_code=429,
             content={"detail": "Rate limit exceeded. Try again later."},
+            headers={
+                "Retry-After": str(exc.retry_after),
+                "X-RateLimit-Remaining": "0",
+            },
         )
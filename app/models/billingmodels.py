@@ -1,13 +1,21 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from enum import Enum
 
 class CarrierEnum(str, Enum):
     FEDEX = "FEDEX"
-    fedex = "FEDEX"
     UPS = "UPS"
-    ups = "UPS"
 
 class Credentials(BaseModel):
     username: str
     password: str
     carrier: CarrierEnum
+
+    @validator("carrier", pre=True)
+    def _uppercase_carrier(cls, value):
+        # Case-insensitive input without duplicate enum members
+        return value.upper() if isinstance(value, str) else value
+
+    class Config:
+        # Credentials are read-only once validated; immutability also lets
+        # them travel through the job queue without defensive copies
+        allow_mutation = False
@@ -4,22 +4,26 @@ from playwright.async_api import async_playwright, TimeoutError as PlaywrightTim
 import random
 import time
 import logging
+from dataclasses import dataclass
 from datetime import datetime
 from app.core.config import config
-from app.utils.playwright_helper import human_type
+from app.utils.playwright_helper import human_type_async
 
-# Set up logging
-logging.basicConfig(
-    filename='script_log.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Logging is configured centrally via app.utils.logging_helper.setup_logging,
+# which hands records to a background thread instead of blocking the loop
 
 def log_and_print(message):
-    """Logs and prints a message for tracking script progress."""
-    print(message)
+    """Logs a progress message; the queue listener echoes it to the console."""
     logging.info(message)
 
+class ScraperThrottledError(ConnectionError):
+    """Raised when the upstream browser provider rejects the session for rate limiting."""
+
+def _is_throttle_error(error: Exception) -> bool:
+    """Detects a provider 429 at the point it surfaces; playwright only exposes the message."""
+    message = str(error)
+    return "429" in message or "Too Many Requests" in message
+
 def setup_download_folder():
     """Creates a timestamped download folder and returns its path for saving files."""
     download_dir = os.path.join(os.getcwd(), f"downloads_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
@@ -27,131 +31,195 @@ def setup_download_folder():
     log_and_print(f"Download folder created: {download_dir}")
     return download_dir
 
+@dataclass(frozen=True)
+class Selector:
+    """Precompiled CSS ','-union and XPath '|'-union for one logical element."""
+    css: str
+    xpath: str
+
+    @classmethod
+    def from_list(cls, selectors):
+        """Partitions a raw selector list into its CSS and XPath unions."""
+        css = [s for s in selectors if not s.startswith("/")]
+        xpath = [s for s in selectors if s.startswith("/")]
+        return cls(css=", ".join(css), xpath=" | ".join(xpath))
+
 class UPSSelectors:
-    LOGIN_USERNAME = [
+    LOGIN_USERNAME = Selector.from_list([
         "input[type='text']", "#email", "//input[@id='email']", "//input[@name='userID']",
         "/html/body/div[1]/div[3]/div/div/div/div/div/main/div/div/div/form/div[2]/div[2]/div/div[1]/input",
         ".ups-form_input.ups-check.ups-active"
-    ]
-    LOGIN_PASSWORD = [
+    ])
+    LOGIN_PASSWORD = Selector.from_list([
         "input[type='password']", "#pwd", "//input[@id='pwd']", "//input[@name='password']",
         "/html/body/div[1]/div[3]/div/div/div/div/div/main/div/div/div/form/div[2]/div[2]/div[2]/div[1]/input",
         ".ups-form_input.ups-has_showhide_icon"
-    ]
-    MY_INVOICES_LINK = [
+    ])
+    MY_INVOICES_LINK = Selector.from_list([
         "#side-nav-link-my-invoices", "//a[@id='side-nav-link-my-invoices']",
         "/html/body/div[2]/div/div/div[1]/ul/li[2]/ul/a[2]",
         ".side-nav-icon-invoice.fa-custom.fa-file-alt", "a[href='/ups/billing/invoice']"
-    ]
-    NEXT_BUTTON = [
+    ])
+    NEXT_BUTTON = Selector.from_list([
         ".paginate_button.next", "//a[@class='paginate_button next']",
         "/html/body/div[2]/div/main/div/div/div/div/div/div[4]/div[2]/div[3]/div[2]/div/a[2]",
         "//a[contains(@aria-label, 'Next Page')]"
-    ]
-    DOWNLOAD_BUTTON = [
+    ])
+    DOWNLOAD_BUTTON = Selector.from_list([
         ".btn-download-invoices", "button[type='button']",
         "/html/body/div[2]/div/main/div/div/div/div/div/div[4]/div[2]/div[1]/div[2]/div/button[1]",
         "//button[contains(@class, 'btn-download-invoices')]"
-    ]
-    MODAL_CLOSE_BUTTON = [
+    ])
+    MODAL_CLOSE_BUTTON = Selector.from_list([
         ".btn-primary", "button[data-test='button']",
         "/html/body/div[3]/div/div[2]/div/div/div[3]/button[1]",
         "//button[contains(text(), 'Close')]"
-    ]
-    DOWNLOAD_OPTION = [
+    ])
+    DOWNLOAD_OPTION = Selector.from_list([
         "#downloadOptionType_csv", "//input[@value='csv']",
         "/html/body/div[3]/div/div[2]/div/div/div[2]/div[2]/div[1]/div/fieldset/div[2]/div",
         ".form-check-input.form-control"
-    ]
-    CONFIRM_DOWNLOAD_BUTTON = [
+    ])
+    CONFIRM_DOWNLOAD_BUTTON = Selector.from_list([
         "#download-multiple-invoice-btn-download", "button[data-test='button']",
         "/html/body/div[3]/div/div[2]/div/div/div[3]/button[1]",
         "//button[contains(text(), 'Download')]"
-    ]
+    ])
+
+async def wait_for_selector(page: Page, selector: str, timeout: float = 10000) -> bool:
+    """Waits for a selector in a single cycle, relying on Playwright's built-in polling."""
+    try:
+        await page.wait_for_selector(selector, timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        log_and_print(f"Timed out waiting for selector {selector}")
+        return False
 
-async def wait_for_selector_with_retry(page: Page, selector: str, retries: int = 3, delay: float = 2.0):
-    """Waits for a selector to appear, retrying if necessary."""
-    for attempt in range(retries):
+async def safe_find_and_click(page: Page, selector, timeout: float = 5000):
+    """Clicks the first element matching a Selector, trying all alternatives in one wait cycle."""
+    if not isinstance(selector, Selector):
+        selector = Selector.from_list(selector)
+    if selector.css:
         try:
-            await page.wait_for_selector(selector, timeout=delay * 1000)
+            await page.locator(selector.css).first.click(timeout=timeout)
+            log_and_print(f"Clicked element using CSS union: {selector.css}")
             return True
-        except PlaywrightTimeoutError:
-            if attempt < retries - 1:
-                log_and_print(f"Retrying... waiting for selector {selector}")
-                await asyncio.sleep(delay)
-            else:
-                log_and_print(f"Failed to find selector {selector} after retries")
-    return False
-
-async def safe_find_and_click(page: Page, selectors, retries=3, delay=2.0):
-    """Attempts to find and click an element using multiple selectors with retries."""
-    for selector in selectors:
-        for attempt in range(retries):
-            try:
-                if await wait_for_selector_with_retry(page, selector):
-                    await page.click(selector)
-                    log_and_print(f"Clicked element using selector: {selector}")
-                    return True
-            except Exception as e:
-                log_and_print(f"Failed to click selector {selector} on attempt {attempt+1}: {e}")
-                if attempt < retries - 1:
-                    await asyncio.sleep(delay)
+        except Exception as e:
+            log_and_print(f"CSS union {selector.css} failed: {e}")
+    if selector.xpath:
+        try:
+            await page.locator(f"xpath={selector.xpath}").first.click(timeout=timeout)
+            log_and_print(f"Clicked element using XPath union: {selector.xpath}")
+            return True
+        except Exception as e:
+            log_and_print(f"XPath union {selector.xpath} failed: {e}")
     log_and_print("No valid selector found.")
     return False
 
 async def click_all_checkboxes(page: Page, skip_first=False):
-    """Clicks all checkboxes on the current page except the first one if skip_first is True."""
-    checkboxes = page.locator("table tbody tr td input[type='checkbox']")
-    count = await checkboxes.count()
-    start = 1 if skip_first else 0
-    for i in range(start, count):
+    """Clicks all checkboxes on the current page in one browser call, optionally skipping the first."""
+    try:
+        # One CDP round trip: the click loop runs inside the browser's JS engine
+        clicked = await page.evaluate(
+            """(skip) => {
+                const boxes = document.querySelectorAll("table tbody tr td input[type='checkbox']");
+                let clicked = 0;
+                boxes.forEach((box, i) => {
+                    if (!(skip && i === 0)) {
+                        box.click();
+                        clicked += 1;
+                    }
+                });
+                return clicked;
+            }""",
+            skip_first,
+        )
+        log_and_print(f"Clicked {clicked} checkboxes in one pass.")
+    except Exception as e:
+        log_and_print(f"Failed to click checkboxes: {e}")
+
+DOWNLOAD_QUEUE_SIZE = 16
+DOWNLOAD_WORKERS = 4
+
+async def download_worker(queue: asyncio.Queue, download_dir: str):
+    """Consumes queued downloads, saving and validating each one."""
+    while True:
+        download = await queue.get()
         try:
-            await checkboxes.nth(i).click()
-            log_and_print(f"Clicked checkbox #{i+1}")
+            await download_and_validate(download, download_dir)
         except Exception as e:
-            log_and_print(f"Failed to click checkbox #{i+1}: {e}")
+            log_and_print(f"Download worker failed on {download.suggested_filename}: {e}")
+        finally:
+            queue.task_done()
 
 async def download_and_validate(download, download_dir):
     """Validates the downloaded file by checking its presence and size."""
     file_path = os.path.join(download_dir, download.suggested_filename)
+    # save_as resolves once the write is complete, so no flush wait is needed
     await download.save_as(file_path)
-    await asyncio.sleep(1)  # Ensure file write completion
 
-    # File validation
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+    # File validation; stat off-loop in case the download dir is on a slow FS
+    try:
+        stat_result = await asyncio.to_thread(os.stat, file_path)
+    except OSError as e:
+        log_and_print(f"Download failed, could not stat {file_path}: {e}")
+        return None
+
+    if stat_result.st_size > 0:
         log_and_print(f"Download validated: {file_path}")
         return file_path
     else:
         log_and_print(f"Download failed or file empty: {file_path}")
         return None
 
+async def debug_screenshot(page: Page, path: str):
+    """Takes a viewport JPEG screenshot when DEBUG is on; skipped on the hot path."""
+    if not config.DEBUG:
+        return
+    # Viewport-only JPEG: full_page=True forces a slow scroll-stitch and a
+    # multi-MB PNG encode on heavy invoice pages
+    await page.screenshot(path=path, type="jpeg", quality=60, full_page=False)
+    log_and_print(f"Screenshot saved to {path}")
+
 async def run_scraper(username: str, password: str) -> str:
     """Run the scraper using provided username and password with robust handling."""
     page_counter = 0
-    download_dir = setup_download_folder()
+    # makedirs is sync filesystem I/O; run it off-loop like the other stat calls
+    download_dir = await asyncio.to_thread(setup_download_folder)
     connection_url = f'wss://browser.zenrows.com?apikey={config.API_KEY}'
 
+    # Bounded queue caps concurrent file writes and surfaces worker failures
+    download_queue = asyncio.Queue(maxsize=DOWNLOAD_QUEUE_SIZE)
+    workers = [
+        asyncio.create_task(download_worker(download_queue, download_dir))
+        for _ in range(DOWNLOAD_WORKERS)
+    ]
+
+    async def enqueue_download(download):
+        await download_queue.put(download)
+
+    browser = None
     async with async_playwright() as p:
         try:
             browser = await p.chromium.connect_over_cdp(connection_url)
             context = await browser.new_context(accept_downloads=True)
             page = await context.new_page()
 
-            page.on("download", lambda download: asyncio.create_task(download_and_validate(download, download_dir)))
+            page.on("download", enqueue_download)
 
             url = "https://www.ups.com/lasso/signin?client_id=rPfJLIzYqDE&scope=openid&response_type=code&redirect_uri=https%3A%2F%2Fbilling.ups.com%2Flogin%2Fcallback&nonce=ZUymyPQJVnxF1qqK5IasBcBl_huvcQSZ7hzD1gTo1P4&state=%2F"
             log_and_print(f"Navigating to {url}")
             await page.goto(url, wait_until="domcontentloaded")
 
             # Entering username
-            if await wait_for_selector_with_retry(page, UPSSelectors.LOGIN_USERNAME[0]):
-                await human_type(page, UPSSelectors.LOGIN_USERNAME[0], username)
+            if await wait_for_selector(page, UPSSelectors.LOGIN_USERNAME.css):
+                await human_type_async(page, UPSSelectors.LOGIN_USERNAME.css, username)
                 await page.keyboard.press("Enter")
                 await asyncio.sleep(2)
 
             # Entering password
-            if await wait_for_selector_with_retry(page, UPSSelectors.LOGIN_PASSWORD[0]):
-                await human_type(page, UPSSelectors.LOGIN_PASSWORD[0], password)
+            if await wait_for_selector(page, UPSSelectors.LOGIN_PASSWORD.css):
+                await human_type_async(page, UPSSelectors.LOGIN_PASSWORD.css, password)
                 await page.keyboard.press("Enter")
                 await asyncio.sleep(5)
 
@@ -165,9 +233,7 @@ async def run_scraper(username: str, password: str) -> str:
             checkbox_selector = "//*[@id='invoice-table_wrapper']/div[2]/div/table/tbody/tr[1]/td[2]"
             if await safe_find_and_click(page, [checkbox_selector]):
                 log_and_print("Clicked on the first invoice checkbox.")
-                screenshot_path = "after_first_checkbox_click.png"
-                await page.screenshot(path=screenshot_path, full_page=True)
-                log_and_print(f"Screenshot saved to {screenshot_path}")
+                await debug_screenshot(page, "after_first_checkbox_click.jpeg")
 
             # Close modal if appears
             await safe_find_and_click(page, UPSSelectors.MODAL_CLOSE_BUTTON)
@@ -195,16 +261,26 @@ async def run_scraper(username: str, password: str) -> str:
                 await safe_find_and_click(page, UPSSelectors.DOWNLOAD_OPTION)
                 await safe_find_and_click(page, UPSSelectors.CONFIRM_DOWNLOAD_BUTTON)
 
-            final_screenshot_path = "final_state.png"
-            await page.screenshot(path=final_screenshot_path, full_page=True)
-            log_and_print(f"Final screenshot saved to {final_screenshot_path}")
+            await debug_screenshot(page, "final_state.jpeg")
 
         except PlaywrightTimeoutError as e:
             log_and_print(f"Timeout occurred: {e}")
         except Exception as e:
             log_and_print(f"An error occurred: {e}")
+            # Propagate throttles as a typed error so callers can back off,
+            # and re-raise connection failures instead of reporting success
+            if _is_throttle_error(e):
+                raise ScraperThrottledError(f"Upstream browser provider throttled the session: {e}") from e
+            if isinstance(e, ConnectionError):
+                raise
         finally:
-            log_and_print("Closing the browser.")
-            await browser.close()
+            # Drain pending downloads before tearing down the browser session
+            log_and_print("Waiting for queued downloads to finish.")
+            await download_queue.join()
+            for worker in workers:
+                worker.cancel()
+            if browser is not None:
+                log_and_print("Closing the browser.")
+                await browser.close()
 
     return download_dir
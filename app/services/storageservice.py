@@ -1,8 +1,10 @@
 import os
 import asyncio
 import aioboto3
-import aiofiles
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError, EndpointConnectionError, NoCredentialsError, BotoCoreError
+from contextlib import AsyncExitStack
+from fastapi import Request
 import logging
 from datetime import datetime
 from typing import List
@@ -18,6 +20,16 @@ AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
 MAX_RETRIES = 3
 RETRY_DELAY = 2  # Seconds
+MAX_CONCURRENT_UPLOADS = 8  # Concurrent uploads sharing a single S3 client
+
+# Multipart handling is delegated to the transfer manager: 16MB chunks cut PUT
+# count and up to 8 parts upload concurrently per file
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=False,
+)
 
 class StorageService:
     def __init__(self):
@@ -33,139 +45,130 @@ class StorageService:
             aws_secret_access_key=AWS_SECRET_KEY,
             region_name=AWS_REGION
         )
+        self.s3_client = None
+        self._exit_stack = None
         logger.debug("Initialized aioboto3 session for S3 access.")
 
-    async def upload_file(self, file_path: str, s3_key: str) -> bool:
+    async def open(self):
         """
-        Upload a single file to S3 with retry and error handling.
+        Open a long-lived S3 client held for the app lifetime so TLS connections
+        are pooled and reused across jobs.
         """
-        async with self.s3_session.client('s3') as s3_client:
-            for attempt in range(1, MAX_RETRIES + 1):
-                try:
-                    logger.info(f"Uploading {file_path} to s3://{AWS_BUCKET_NAME}/{s3_key}, attempt {attempt}.")
-                    await s3_client.upload_file(file_path, AWS_BUCKET_NAME, s3_key)
-                    logger.info(f"Upload successful for {file_path} as {s3_key}.")
-                    return True
-                except (ClientError, EndpointConnectionError) as e:
-                    error_code = e.response.get('Error', {}).get('Code', 'Unknown')
-                    logger.error(f"Upload attempt {attempt} failed for {file_path} with error: {error_code} - {e}")
-                    if error_code in ('RequestTimeout', 'Throttling'):
-                        logger.warning("Transient error detected, retrying after delay.")
-                        await asyncio.sleep(RETRY_DELAY * attempt)
-                    else:
-                        break
-                except Exception as e:
-                    logger.exception(f"Unexpected error during upload of {file_path}: {e}")
-                    break
-            logger.error(f"Upload failed for {file_path} after {MAX_RETRIES} attempts.")
-            return False
+        if self.s3_client is None:
+            self._exit_stack = AsyncExitStack()
+            self.s3_client = await self._exit_stack.enter_async_context(self.s3_session.client('s3'))
+            logger.info("Opened persistent S3 client.")
 
-    async def multipart_upload(self, file_path: str, s3_key: str) -> bool:
+    async def warm(self):
         """
-        Perform a multipart upload for large files with detailed error handling and retries.
+        Pre-warm the S3 client with a cheap head_bucket call so botocore's lazy
+        model load and the TLS handshake happen at startup, not on the first job.
         """
-        async with self.s3_session.client('s3') as s3_client:
-            try:
-                file_size = os.path.getsize(file_path)
-                part_size = 5 * 1024 * 1024  # 5MB per part
-                if file_size <= part_size:
-                    return await self.upload_file(file_path, s3_key)
-
-                logger.info(f"Initiating multipart upload for {file_path} to {AWS_BUCKET_NAME}/{s3_key}")
-                create_response = await s3_client.create_multipart_upload(Bucket=AWS_BUCKET_NAME, Key=s3_key)
-                upload_id = create_response['UploadId']
-                parts = []
-
-                async with aiofiles.open(file_path, 'rb') as file:
-                    part_number = 1
-                    while True:
-                        part_data = await file.read(part_size)
-                        if not part_data:
-                            break
-
-                        # Upload each part with retries
-                        for attempt in range(1, MAX_RETRIES + 1):
-                            try:
-                                logger.debug(f"Uploading part {part_number} of {s3_key}, attempt {attempt}")
-                                part_response = await s3_client.upload_part(
-                                    Bucket=AWS_BUCKET_NAME,
-                                    Key=s3_key,
-                                    PartNumber=part_number,
-                                    UploadId=upload_id,
-                                    Body=part_data
-                                )
-                                parts.append({'PartNumber': part_number, 'ETag': part_response['ETag']})
-                                logger.info(f"Part {part_number} uploaded successfully.")
-                                break
-                            except (ClientError, EndpointConnectionError) as e:
-                                error_code = e.response.get('Error', {}).get('Code', 'Unknown')
-                                logger.error(f"Error on part {part_number} upload: {error_code} - {e}")
-                                if attempt < MAX_RETRIES:
-                                    await asyncio.sleep(RETRY_DELAY * attempt)
-                                else:
-                                    logger.critical(f"Part {part_number} failed after {MAX_RETRIES} attempts.")
-                                    await self.abort_multipart_upload(s3_client, upload_id, s3_key)
-                                    return False
-                        part_number += 1
-
-                # Complete the multipart upload
-                logger.info(f"Completing multipart upload for {file_path}")
-                await s3_client.complete_multipart_upload(
-                    Bucket=AWS_BUCKET_NAME,
-                    Key=s3_key,
-                    UploadId=upload_id,
-                    MultipartUpload={'Parts': parts}
-                )
-                logger.info(f"Multipart upload completed for {file_path} to {s3_key}")
-                return True
-            except ClientError as e:
-                logger.error(f"Client error during multipart upload of {file_path}: {e}")
-                await self.abort_multipart_upload(s3_client, upload_id, s3_key)
-            except EndpointConnectionError as e:
-                logger.error(f"Network error during multipart upload of {file_path}: {e}")
-                await self.abort_multipart_upload(s3_client, upload_id, s3_key)
-            except Exception as e:
-                logger.exception(f"Unexpected error during multipart upload of {file_path}: {e}")
-                await self.abort_multipart_upload(s3_client, upload_id, s3_key)
-            return False
+        if self.s3_client is None:
+            return
+        try:
+            await self.s3_client.head_bucket(Bucket=AWS_BUCKET_NAME)
+            logger.info(f"Warmed S3 client against bucket {AWS_BUCKET_NAME}.")
+        except Exception as e:
+            # Warm-up is best effort; real uploads surface any genuine failure
+            logger.warning(f"S3 warm-up head_bucket failed: {e}")
 
-    async def abort_multipart_upload(self, s3_client, upload_id: str, s3_key: str):
+    async def close(self):
         """
-        Abort a multipart upload if an error occurs.
+        Close the long-lived S3 client.
         """
-        try:
-            logger.warning(f"Aborting multipart upload for {s3_key} with UploadId {upload_id}.")
-            await s3_client.abort_multipart_upload(Bucket=AWS_BUCKET_NAME, Key=s3_key, UploadId=upload_id)
-            logger.info(f"Aborted multipart upload for {s3_key}")
-        except Exception as e:
-            logger.error(f"Failed to abort multipart upload for {s3_key}: {e}")
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self.s3_client = None
+            logger.info("Closed persistent S3 client.")
+
+    async def upload_file(self, s3_client, file_path: str, s3_key: str) -> bool:
+        """
+        Upload a single file to S3 with retry and error handling, reusing the provided client.
+        """
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                logger.info(f"Uploading {file_path} to s3://{AWS_BUCKET_NAME}/{s3_key}, attempt {attempt}.")
+                await s3_client.upload_file(file_path, AWS_BUCKET_NAME, s3_key, Config=TRANSFER_CONFIG)
+                logger.info(f"Upload successful for {file_path} as {s3_key}.")
+                return True
+            except (ClientError, EndpointConnectionError) as e:
+                error_code = e.response.get('Error', {}).get('Code', 'Unknown')
+                logger.error(f"Upload attempt {attempt} failed for {file_path} with error: {error_code} - {e}")
+                if error_code in ('RequestTimeout', 'Throttling'):
+                    logger.warning("Transient error detected, retrying after delay.")
+                    await asyncio.sleep(RETRY_DELAY * attempt)
+                else:
+                    break
+            except Exception as e:
+                logger.exception(f"Unexpected error during upload of {file_path}: {e}")
+                break
+        logger.error(f"Upload failed for {file_path} after {MAX_RETRIES} attempts.")
+        return False
 
     async def upload_files(self, directory: str) -> List[str]:
         """
-        Upload all files in a directory to S3, logging each successful upload.
+        Upload all files in a directory to S3 concurrently, sharing a single S3 client
+        and logging each successful upload.
         """
         if not os.path.isdir(directory):
             logger.critical(f"Directory does not exist: {directory}")
             return []
 
-        success_files = []
-        total_files = len(os.listdir(directory))
-        if total_files == 0:
+        # Single scandir pass: DirEntry caches the stat, so each file costs one
+        # syscall instead of separate listdir/isfile calls
+        with os.scandir(directory) as it:
+            entries = [(entry.path, entry.name) for entry in it if entry.is_file()]
+
+        if not entries:
             logger.warning(f"No files found in directory: {directory}")
             return []
 
-        for filename in os.listdir(directory):
-            file_path = os.path.join(directory, filename)
-            s3_key = f"{datetime.now().strftime('%Y/%m/%d')}/{filename}"
-            
-            if os.path.isfile(file_path):
+        # Prefer the persistent client opened at startup; fall back to a
+        # temporary one for standalone use
+        if self.s3_client is not None:
+            return await self._upload_entries(self.s3_client, entries)
+        async with self.s3_session.client('s3') as s3_client:
+            return await self._upload_entries(s3_client, entries)
+
+    async def _upload_entries(self, s3_client, entries) -> List[str]:
+        """
+        Upload (path, name) entries concurrently through the given client.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+        async def upload_one(file_path: str, s3_key: str) -> bool:
+            async with semaphore:
                 logger.info(f"Starting upload for {file_path}.")
-                if await self.multipart_upload(file_path, s3_key):
-                    success_files.append(file_path)
-                else:
-                    logger.error(f"Upload failed for {file_path}.")
+                return await self.upload_file(s3_client, file_path, s3_key)
+
+        # Hoisted out of the loop: one clock read for the whole batch
+        date_prefix = datetime.utcnow().strftime('%Y/%m/%d')
+
+        file_paths = []
+        tasks = []
+        for file_path, filename in entries:
+            s3_key = f"{date_prefix}/{filename}"
+            file_paths.append(file_path)
+            tasks.append(upload_one(file_path, s3_key))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        success_files = []
+        for file_path, result in zip(file_paths, results):
+            if result is True:
+                success_files.append(file_path)
+            elif isinstance(result, Exception):
+                logger.error(f"Upload failed for {file_path}: {result}")
+            else:
+                logger.error(f"Upload failed for {file_path}.")
         return success_files
 
+def get_storage_service(request: Request) -> StorageService:
+    """FastAPI dependency returning the StorageService created at startup."""
+    return request.app.state.storage
+
 if __name__ == "__main__":
     storage = StorageService()
     uploaded_files = asyncio.run(storage.upload_files('/path/to/files'))
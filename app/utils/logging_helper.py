@@ -0,0 +1,41 @@
+import logging
+import os
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
+
+LOG_FILE = "script_log.log"
+
+_listener = None
+
+def setup_logging():
+    """
+    Routes all logging through a queue so file and console writes happen on a
+    background thread instead of blocking the event loop. The level comes from
+    LOG_LEVEL (default INFO); raise it to WARNING in production so hot-path
+    info records never even reach the queue.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler = logging.FileHandler(LOG_FILE)
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    queue = Queue()
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.handlers.clear()
+    root.addHandler(QueueHandler(queue))
+
+    _listener = QueueListener(queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """Stops the queue listener, flushing any buffered records."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
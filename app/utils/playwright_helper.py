@@ -3,9 +3,12 @@ import random
 import time
 
 def human_type(page, selector, text):
-    for char in text:
-        page.type(selector, char, delay=random.randint(100, 200))
-        time.sleep(random.uniform(0.05, 0.15))
+    # Playwright's delay already jitters keystrokes inside the browser,
+    # so one batched call replaces the per-character loop and its sleeps
+    page.type(selector, text, delay=random.randint(40, 100))
+
+async def human_type_async(page, selector, text):
+    await page.type(selector, text, delay=random.randint(40, 100))
 
 def safe_wait_for_selector(page, selector, timeout=30000, retries=3):
     for attempt in range(retries):
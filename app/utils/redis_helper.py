@@ -1,64 +1,107 @@
-import aioredis
-import json
-import time
+import asyncio
 import logging
 from typing import Optional
+
+from fastapi import Request
+from redis.asyncio import ConnectionPool, Redis
+
 from app.utils.config import REDIS_HOST, REDIS_PORT, REDIS_DB  # Import from config.py
 
-# Retry settings
-MAX_RETRIES = 5
-INITIAL_BACKOFF = 1  # seconds
-
-# Redis client (using aioredis for async operations)
-redis_pool: Optional[aioredis.Redis] = None
-
-async def get_redis_client() -> aioredis.Redis:
-    """Returns a Redis client (with retry mechanism for connection failures)."""
-    global redis_pool
-    
-    if redis_pool is None:
-        retries = 0
-        while retries < MAX_RETRIES:
-            try:
-                redis_pool = await aioredis.create_redis_pool(
-                    (REDIS_HOST, REDIS_PORT), db=REDIS_DB
+# Connection pool settings
+REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
+MAX_CONNECTIONS = 50
+
+# Shared Redis client backed by a single connection pool
+redis_pool: Optional[ConnectionPool] = None
+redis_client: Optional[Redis] = None
+_init_lock = asyncio.Lock()
+
+async def get_redis_client() -> Redis:
+    """Returns the shared Redis client, creating the connection pool once under a lock."""
+    global redis_pool, redis_client
+
+    if redis_client is None:
+        async with _init_lock:
+            if redis_client is None:
+                redis_pool = ConnectionPool.from_url(
+                    REDIS_URL, max_connections=MAX_CONNECTIONS, decode_responses=True
                 )
-                logging.info("Connected to Redis.")
-                return redis_pool
-            except (aioredis.RedisError, ConnectionError) as e:
-                retries += 1
-                wait_time = INITIAL_BACKOFF * (2 ** retries)  # Exponential backoff
-                logging.warning(f"Redis connection failed (attempt {retries}/{MAX_RETRIES}). Retrying in {wait_time}s...")
-                time.sleep(wait_time)
-                
-        logging.error(f"Could not connect to Redis after {MAX_RETRIES} attempts.")
-        raise ConnectionError("Unable to connect to Redis.")
-
-    return redis_pool
-
-async def set_job_status(job_id: str, status: str):
-    """Sets the job status in Redis asynchronously with retry logic."""
+                redis_client = Redis(connection_pool=redis_pool)
+                logging.info("Redis connection pool created.")
+
+    return redis_client
+
+async def get_redis(request: Request) -> Redis:
+    """FastAPI dependency returning the Redis client stored on app state at startup."""
+    return request.app.state.redis
+
+async def set_status_raw(key: str, status: str, ex: Optional[int] = None):
+    """Sets a status under a precomputed key, so hot paths derive the key once per job."""
     try:
         redis = await get_redis_client()
-        await redis.set(job_id, status)
-        logging.info(f"Job status for {job_id} set to {status}.")
+        await redis.set(key, status, ex=ex)
+        logging.info(f"Job status for {key} set to {status}.")
     except Exception as e:
-        logging.error(f"Error setting job status for {job_id}: {e}")
+        logging.error(f"Error setting job status for {key}: {e}")
+
+async def set_job_status(job_id: str, status: str, ex: Optional[int] = None):
+    """Sets the job status in Redis asynchronously, with an optional TTL in seconds."""
+    await set_status_raw(job_id, status, ex=ex)
+
+# Terminal status writes and the webhook event travel in one Lua EVAL so a
+# worker crash can never leave a terminal status without its outbox entry
+WEBHOOK_OUTBOX_STREAM = "webhook:outbox"
+_SET_TERMINAL_AND_ENQUEUE = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+if ARGV[2] ~= '' then
+    redis.call('SET', KEYS[1] .. ':result', ARGV[2], 'EX', ARGV[3])
+end
+redis.call('XADD', KEYS[2], '*', 'job_id', ARGV[4], 'status', ARGV[1], 'message', ARGV[2])
+return 1
+"""
+_terminal_script = None
+
+async def publish_terminal_status(job_id: str, status: str, message: Optional[str] = None, ex: int = 3600):
+    """
+    Atomically records the terminal job status (and optional result) and appends
+    a webhook event to the outbox stream in a single scripted round trip.
+    """
+    global _terminal_script
+    try:
+        redis = await get_redis_client()
+        if _terminal_script is None:
+            _terminal_script = redis.register_script(_SET_TERMINAL_AND_ENQUEUE)
+        await _terminal_script(
+            keys=[job_id, WEBHOOK_OUTBOX_STREAM],
+            args=[status, message or "", ex, job_id],
+        )
+        logging.info(f"Job {job_id} terminal status {status} published to outbox.")
+    except Exception as e:
+        logging.error(f"Error publishing terminal status for {job_id}: {e}")
+
+async def set_job_status_pipeline(job_id: str, statuses: list, ex: int = 3600):
+    """Sets a sequence of job statuses in one Redis round trip via a pipeline."""
+    try:
+        redis = await get_redis_client()
+        async with redis.pipeline(transaction=False) as pipe:
+            for status in statuses:
+                pipe.set(job_id, status, ex=ex)
+            await pipe.execute()
+        logging.info(f"Job status for {job_id} set to {statuses[-1]} (pipelined).")
+    except Exception as e:
+        logging.error(f"Error pipelining job statuses for {job_id}: {e}")
 
 async def get_job_status(job_id: str) -> Optional[str]:
-    """Gets the job status from Redis asynchronously with retry logic."""
+    """Gets the job status from Redis asynchronously."""
     try:
         redis = await get_redis_client()
-        status = await redis.get(job_id)
-        if status:
-            return status.decode("utf-8")
-        return None
+        return await redis.get(job_id)
     except Exception as e:
         logging.error(f"Error getting job status for {job_id}: {e}")
         return None
 
 async def delete_job_status(job_id: str):
-    """Deletes the job status from Redis asynchronously with retry logic."""
+    """Deletes the job status from Redis asynchronously."""
     try:
         redis = await get_redis_client()
         await redis.delete(job_id)
@@ -68,8 +111,11 @@ async def delete_job_status(job_id: str):
 
 async def close_redis_pool():
     """Closes the Redis connection pool gracefully."""
-    global redis_pool
+    global redis_pool, redis_client
+    if redis_client:
+        await redis_client.close()
+        redis_client = None
     if redis_pool:
-        redis_pool.close()
-        await redis_pool.wait_closed()
+        await redis_pool.disconnect()
+        redis_pool = None
         logging.info("Redis connection pool closed.")
@@ -1,82 +1,308 @@
 import uuid
 import logging
-import httpx
+import aiohttp
 import asyncio
+import orjson
 import os
-from fastapi import BackgroundTasks
-from app.services.billingservice import run_scraper
+import random
+import time
+from collections import deque
+from functools import lru_cache
+from urllib.parse import urlparse
+from app.core.backpressure import scraper_controller
+from app.services.billingservice import run_scraper, ScraperThrottledError
 from app.models.billingmodels import Credentials
-from app.utils.redis_helper import set_job_status, get_job_status
-from dotenv import load_dotenv
+from app.utils.redis_helper import set_job_status, publish_terminal_status, get_job_status
 
-# Load environment variables from .env file if present
-load_dotenv()
-
-# Set up logging for this module
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Logging is configured centrally by app.utils.logging_helper at startup;
+# configuring the root logger at import time would duplicate handlers
 logger = logging.getLogger(__name__)
 
-# Retrieve the webhook URL from the environment
-WEBHOOK_URL = os.getenv("WEBHOOK_URL")
-if not WEBHOOK_URL:
-    raise EnvironmentError("WEBHOOK_URL environment variable is not set.")
+@lru_cache(maxsize=1)
+def get_webhook_url() -> str:
+    """Resolves the webhook URL on first use so importing the module doesn't require it."""
+    url = os.getenv("WEBHOOK_URL")
+    if not url:
+        raise EnvironmentError("WEBHOOK_URL environment variable is not set.")
+    return url
+
+# Webhook retry backoff: full jitter so concurrently failing jobs don't
+# retry in lockstep against a struggling endpoint
+BACKOFF_BASE = 0.5  # Seconds
+BACKOFF_CAP = 30.0  # Seconds
+
+# The only 4xx responses worth retrying; every other client error is a
+# misconfigured endpoint that will reject the next attempt too
+RETRIABLE_4XX_STATUSES = {408, 425, 429}
+
+# Built once: the same headers dict is shared by every webhook post
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Gate webhook fan-out so a burst of finishing jobs can't exhaust the shared
+# connector pool and head-of-line block every other notification
+_WEBHOOK_SEM = asyncio.Semaphore(int(os.getenv("WEBHOOK_CONCURRENCY", "64")))
+
+# Bounded job queue: bursts of requests queue up instead of spawning an
+# unbounded scraper per request, and long-lived workers give clean shutdown.
+# Jobs land in per-username queues and a deficit round-robin scheduler feeds
+# the workers, so one tenant's burst can't starve everyone else's jobs.
+JOB_QUEUE_SIZE = 256  # Total pending jobs across all users
+N_WORKERS = int(os.getenv("SCRAPER_WORKERS", "4"))
+DEFICIT_QUANTUM = 1  # Jobs a user earns per scheduling round
+
+job_queue = None  # Dispatch queue feeding the workers; kept shallow so
+                  # fairness decisions happen as late as possible
+_user_queues = {}  # username -> deque of (credentials, job_id)
+_user_ring = deque()  # Round-robin order of users with pending jobs
+_user_deficits = {}  # username -> unspent quantum carried between rounds
+_pending_count = 0
+_sched_cond = None
+_scheduler_task = None
+_worker_tasks = []
+
+async def start_job_workers():
+    """Creates the job queues and spawns the scheduler and worker coroutines."""
+    global job_queue, _sched_cond, _scheduler_task
+    if job_queue is not None:
+        return
+    job_queue = asyncio.Queue(maxsize=N_WORKERS)
+    _sched_cond = asyncio.Condition()
+    _scheduler_task = asyncio.create_task(_scheduler())
+    for _ in range(N_WORKERS):
+        _worker_tasks.append(asyncio.create_task(_job_worker()))
+    logger.info("Started %s scraper job workers (queue size %s).", N_WORKERS, JOB_QUEUE_SIZE)
+
+async def _scheduler():
+    """
+    Deficit round-robin over the per-user queues: each round the head user
+    earns DEFICIT_QUANTUM and dispatches that many jobs, so tenants drain at
+    the same rate regardless of how deep any one tenant's backlog is.
+    """
+    global _pending_count
+    while True:
+        async with _sched_cond:
+            while not _user_ring:
+                await _sched_cond.wait()
+            user = _user_ring.popleft()
+            queue = _user_queues[user]
+            _user_deficits[user] = _user_deficits.get(user, 0) + DEFICIT_QUANTUM
+            batch = []
+            while queue and _user_deficits[user] >= 1:
+                batch.append(queue.popleft())
+                _user_deficits[user] -= 1
+                _pending_count -= 1
+            if queue:
+                _user_ring.append(user)
+            else:
+                # Idle users drop out of the ring; the deficit resets so a
+                # returning user can't bank quantum while absent
+                del _user_queues[user]
+                _user_deficits.pop(user, None)
+        for job in batch:
+            await job_queue.put(job)  # Blocks while all workers are busy
+
+async def _job_worker():
+    """Pulls jobs off the dispatch queue and runs them until cancelled at shutdown."""
+    while True:
+        credentials, job_id = await job_queue.get()
+        try:
+            await _run_scraper_task(credentials, job_id)
+        except Exception as e:
+            logger.critical("Job worker crashed on job %s: %s", job_id, e)
+        finally:
+            job_queue.task_done()
+
+async def stop_job_workers():
+    """Cancels the scheduler and worker coroutines; called from the app shutdown hook."""
+    global job_queue, _sched_cond, _scheduler_task, _pending_count
+    tasks = list(_worker_tasks)
+    if _scheduler_task is not None:
+        tasks.append(_scheduler_task)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _worker_tasks.clear()
+    _user_queues.clear()
+    _user_ring.clear()
+    _user_deficits.clear()
+    _pending_count = 0
+    _scheduler_task = None
+    _sched_cond = None
+    job_queue = None
+
+def job_queue_full() -> bool:
+    """True when the pending-job bound cannot accept another scraper job."""
+    return job_queue is not None and _pending_count >= JOB_QUEUE_SIZE
+
+async def _enqueue_job(credentials: Credentials, job_id: str):
+    """Appends the job to its user's queue and wakes the scheduler."""
+    global _pending_count
+    async with _sched_cond:
+        username = credentials.username
+        queue = _user_queues.get(username)
+        if queue is None:
+            queue = deque()
+            _user_queues[username] = queue
+            _user_ring.append(username)
+        queue.append((credentials, job_id))
+        _pending_count += 1
+        _sched_cond.notify()
+
+class WebhookCircuitBreaker:
+    """
+    Per-host circuit breaker so jobs fail fast instead of sitting through full
+    retry backoff while a webhook endpoint is down. After `failure_threshold`
+    consecutive failed notifications the circuit opens for `reset_timeout`
+    seconds, then lets a single probe through (half-open) to test recovery.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = {}  # netloc -> [consecutive_failures, last_failure_at]
+
+    def is_open(self, host: str) -> bool:
+        state = self._state.get(host)
+        if not state or state[0] < self.failure_threshold:
+            return False
+        if time.monotonic() - state[1] >= self.reset_timeout:
+            # Half-open: allow one probe and restart the window until it succeeds
+            state[1] = time.monotonic()
+            return False
+        return True
+
+    def record_success(self, host: str):
+        self._state.pop(host, None)
+
+    def record_failure(self, host: str):
+        failures = self._state.get(host, [0, 0.0])[0]
+        self._state[host] = [failures + 1, time.monotonic()]
+
+_webhook_breaker = WebhookCircuitBreaker()
 
-async def run_scraper_job(credentials: Credentials, background_tasks: BackgroundTasks):
+# Shared webhook HTTP session: keep-alive connections are reused across jobs
+# and retries instead of paying a TCP+TLS handshake per post
+_http_session = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Returns the shared webhook session, creating it on first use inside a running loop."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        # force_close=False keeps connections alive for reuse across posts;
+        # enable_cleanup_closed reaps half-closed TLS transports so the pool
+        # isn't clogged with dead sockets under churn
+        connector = aiohttp.TCPConnector(
+            limit=200,
+            limit_per_host=64,
+            keepalive_timeout=30,
+            force_close=False,
+            enable_cleanup_closed=True,
+        )
+        _http_session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=10)
+        )
+    return _http_session
+
+async def close_http_session():
+    """Closes the shared webhook session; called from the app shutdown hook."""
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
+async def run_scraper_job(credentials: Credentials):
     """Handler for initiating the scraper job."""
-    job_id = str(uuid.uuid4())  # Unique job ID
+    job_id = uuid.uuid4().hex  # Unique job ID; .hex skips the hyphenated-str allocation
+
+    if job_queue is None:
+        await start_job_workers()  # Lazy start for standalone/test use
 
     try:
         await set_job_status(job_id, "pending")  # Set initial job status to pending
-        logger.info(f"Job {job_id} started with status 'pending'.")
+        logger.info("Job %s started with status 'pending'.", job_id)
     except Exception as e:
-        logger.critical(f"Failed to set initial status for job {job_id}: {e}")
+        logger.critical("Failed to set initial status for job %s: %s", job_id, e)
         raise RuntimeError(f"Job {job_id} initialization failed.")
 
-    # Add the scraper task to the background queue
-    background_tasks.add_task(_run_scraper_task, credentials, job_id, WEBHOOK_URL)
-    
+    # Enqueue the job into its user's queue for fair dispatch
+    await _enqueue_job(credentials, job_id)
+
     return job_id
 
-async def _run_scraper_task(credentials: Credentials, job_id: str, webhook_url: str):
-    """Task that runs the scraper and updates the job status."""
+async def _run_scraper_task(credentials: Credentials, job_id: str):
+    """Task that runs the scraper under the AIMD controller and updates the job status."""
+    await scraper_controller.acquire()
+    started_at = time.monotonic()
+    success = False
+    throttled = False
     try:
+        # Hoist the model attribute reads once; pydantic v1 __getattr__ is
+        # slow enough to show up at high job rates
+        username = credentials.username
+        password = credentials.password
+
         await set_job_status(job_id, "processing")  # Update job status to 'processing'
-        logger.info(f"Job {job_id} is now processing.")
-        
+        logger.info("Job %s is now processing.", job_id)
+
         # Run the scraper and check for valid response
-        download_dir = await run_scraper(credentials.username, credentials.password)
+        download_dir = await run_scraper(username, password)
         if not download_dir:
             raise ValueError("No download directory returned; scraper likely failed.")
+        success = True
 
-        # Job completed successfully
-        await set_job_status(job_id, "completed")
-        logger.info(f"Job {job_id} completed successfully. Files saved to {download_dir}.")
-        
-        # Notify via webhook on success
-        await send_webhook_notification(webhook_url, job_id, "completed", download_dir)
+        # One atomic round trip records the terminal status and enqueues the
+        # webhook event; the outbox dispatcher performs the actual POST
+        await publish_terminal_status(job_id, "completed", download_dir)
+        logger.info("Job %s completed successfully. Files saved to %s.", job_id, download_dir)
 
     except ValueError as e:
-        await handle_job_failure(job_id, f"Scraper error: {e}", webhook_url)
-        
+        await handle_job_failure(job_id, f"Scraper error: {e}")
+
+    except ScraperThrottledError as e:
+        # Typed throttle signal from the scraper feeds the AIMD breaker
+        throttled = True
+        await handle_job_failure(job_id, f"Upstream throttled the scraper: {e}")
+
     except ConnectionError as e:
-        await handle_job_failure(job_id, f"Connection error during scraper run: {e}", webhook_url)
-        
+        await handle_job_failure(job_id, f"Connection error during scraper run: {e}")
+
+    except asyncio.CancelledError:
+        # Shutdown cancellation must propagate so workers stop cleanly;
+        # the finally block still releases the controller slot
+        raise
+
     except Exception as e:
-        await handle_job_failure(job_id, f"Unexpected error: {e}", webhook_url)
+        await handle_job_failure(job_id, f"Unexpected error: {e}")
 
-async def handle_job_failure(job_id: str, error_message: str, webhook_url: str):
+    finally:
+        await scraper_controller.release(
+            latency=time.monotonic() - started_at, success=success, throttled=throttled
+        )
+
+async def handle_job_failure(job_id: str, error_message: str):
     """
-    Gracefully handle job failure by setting the job status to 'failed', logging the error, and sending a webhook notification.
+    Gracefully handle job failure by atomically recording the 'failed' status and
+    enqueueing the webhook event for the outbox dispatcher.
     """
     try:
-        await set_job_status(job_id, "failed")
-        logger.error(f"Job {job_id} failed. Error: {error_message}")
-        
-        # Notify via webhook on failure
-        await send_webhook_notification(webhook_url, job_id, "failed", error_message)
+        logger.error("Job %s failed. Error: %s", job_id, error_message)
+        await publish_terminal_status(job_id, "failed", error_message)
+
+    except asyncio.CancelledError:
+        raise
 
     except Exception as e:
-        logger.critical(f"Failed to update status to 'failed' for job {job_id}. Original error: {error_message}. Status update error: {e}")
+        logger.critical("Failed to update status to 'failed' for job %s. Original error: %s. Status update error: %s", job_id, error_message, e)
+
+def _parse_retry_after(value):
+    """Parses a Retry-After header's delta-seconds form; returns None when absent or not numeric."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # HTTP-date form; the jittered backoff covers it
+        return None
 
 async def send_webhook_notification(webhook_url: str, job_id: str, status: str, message: str, max_retries: int = 3):
     """
@@ -89,31 +315,59 @@ async def send_webhook_notification(webhook_url: str, job_id: str, status: str,
         message (str): Additional information (download directory or error message).
         max_retries (int): The maximum number of retry attempts for the webhook notification.
     """
-    payload = {
+    # Serialize once with orjson (retries resend the same bytes) instead of
+    # letting aiohttp re-encode the dict through stdlib json on every attempt
+    body = orjson.dumps({
         "job_id": job_id,
         "status": status,
         "message": message,
-    }
-    
-    # Retry logic
-    for attempt in range(1, max_retries + 1):
-        try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                response = await client.post(webhook_url, json=payload)
-                
-                if response.status_code == 200:
-                    logger.info(f"Webhook notification for job {job_id} sent successfully.")
-                    return  # Exit on success
-                else:
-                    logger.error(f"Failed to send webhook for job {job_id}. Response status: {response.status_code}. Attempt {attempt} of {max_retries}")
-        
-        except httpx.RequestError as e:
-            logger.error(f"Request error on webhook for job {job_id}: {e}. Attempt {attempt} of {max_retries}")
-        except Exception as e:
-            logger.critical(f"Unexpected error sending webhook for job {job_id}: {e}. Attempt {attempt} of {max_retries}")
+    })
+
+
+    host = urlparse(webhook_url).netloc
+    if _webhook_breaker.is_open(host):
+        logger.warning("Webhook circuit open for %s; dropping notification for job %s.", host, job_id)
+        return
+
+    session = get_http_session()
+
+    # Retry logic, gated so concurrent notifications can't starve the connector
+    async with _WEBHOOK_SEM:
+        for attempt in range(1, max_retries + 1):
+            retry_after = None
+            try:
+                async with session.post(webhook_url, data=body, headers=_JSON_HEADERS) as response:
+                    code = response.status
+                    if 200 <= code < 300:
+                        logger.info("Webhook notification for job %s sent successfully.", job_id)
+                        _webhook_breaker.record_success(host)
+                        return  # Exit on success
+                    elif 400 <= code < 500 and code not in RETRIABLE_4XX_STATUSES:
+                        # Retrying a misconfigured endpoint just burns the retry budget;
+                        # the host is responsive, so the circuit stays closed
+                        logger.error("Webhook for job %s rejected with non-retriable status %s. Giving up.", job_id, code)
+                        _webhook_breaker.record_success(host)
+                        return
+                    else:
+                        # 5xx / 408 / 425 / 429: transient, retry after any
+                        # server-suggested delay
+                        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                        logger.error("Failed to send webhook for job %s. Response status: %s. Attempt %s of %s", job_id, code, attempt, max_retries)
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error("Request error on webhook for job %s: %s. Attempt %s of %s", job_id, e, attempt, max_retries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.critical("Unexpected error sending webhook for job %s: %s. Attempt %s of %s", job_id, e, attempt, max_retries)
 
-        # Wait before retrying
-        await asyncio.sleep(2 ** attempt)
+            # Honor the server's Retry-After when given; otherwise back off
+            # with full jitter to avoid thundering-herd retries
+            if retry_after is not None:
+                await asyncio.sleep(min(BACKOFF_CAP, retry_after))
+            else:
+                await asyncio.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
 
     # Log final failure after all retries
-    logger.critical(f"Webhook notification failed for job {job_id} after {max_retries} attempts.")
+    _webhook_breaker.record_failure(host)
+    logger.critical("Webhook notification failed for job %s after %s attempts.", job_id, max_retries)
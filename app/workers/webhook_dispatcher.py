@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+from redis.exceptions import ResponseError
+
+from app.utils.redis_helper import get_redis_client, WEBHOOK_OUTBOX_STREAM
+from app.workers.job_handler import send_webhook_notification, get_webhook_url
+
+# Logging is configured centrally by app.utils.logging_helper at startup
+logger = logging.getLogger(__name__)
+
+# Consumer-group settings: XACK after a processed entry gives at-least-once
+# delivery, so a dispatcher crash replays the event instead of losing it
+CONSUMER_GROUP = "webhook-dispatchers"
+CONSUMER_NAME = "dispatcher-1"
+READ_BATCH = 16
+BLOCK_MS = 5000
+
+_dispatcher_task = None
+
+async def start_webhook_dispatcher():
+    """Creates the outbox consumer group and spawns the dispatch loop."""
+    global _dispatcher_task
+    if _dispatcher_task is not None:
+        return
+    redis = await get_redis_client()
+    try:
+        await redis.xgroup_create(WEBHOOK_OUTBOX_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise  # Group already existing is the normal restart case
+    _dispatcher_task = asyncio.create_task(_dispatch_loop())
+    logger.info("Webhook dispatcher started on stream %s.", WEBHOOK_OUTBOX_STREAM)
+
+async def stop_webhook_dispatcher():
+    """Cancels the dispatch loop; called from the app shutdown hook."""
+    global _dispatcher_task
+    if _dispatcher_task is not None:
+        _dispatcher_task.cancel()
+        await asyncio.gather(_dispatcher_task, return_exceptions=True)
+        _dispatcher_task = None
+
+async def _dispatch_loop():
+    """
+    Consumes webhook events from the outbox stream and performs the actual
+    HTTP POSTs. Entries are acknowledged only after the notification attempt
+    finishes, so events survive a dispatcher crash mid-send.
+    """
+    redis = await get_redis_client()
+    # Start from id "0": entries delivered to this consumer but never XACKed
+    # before a crash sit in its pending list and are only returned by a
+    # historical read, so drain those first, then switch to new entries
+    read_id = "0"
+    while True:
+        try:
+            entries = await redis.xreadgroup(
+                CONSUMER_GROUP,
+                CONSUMER_NAME,
+                {WEBHOOK_OUTBOX_STREAM: read_id},
+                count=READ_BATCH,
+                block=BLOCK_MS if read_id == ">" else None,
+            )
+            if read_id != ">" and not any(messages for _, messages in entries or []):
+                read_id = ">"  # Pending backlog drained; tail the stream
+                continue
+            # Deliver the whole batch concurrently so one slow endpoint's
+            # retry backoff can't head-of-line block the other notifications;
+            # _WEBHOOK_SEM in job_handler still bounds total fan-out
+            results = await asyncio.gather(
+                *(
+                    _deliver(redis, message_id, fields)
+                    for _, messages in entries or []
+                    for message_id, fields in messages
+                ),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    # Unacked entries stay pending and replay on restart
+                    logger.error("Webhook delivery errored: %s", result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Webhook dispatcher error: %s", e)
+            await asyncio.sleep(1)
+
+async def _deliver(redis, message_id, fields):
+    """Posts one outbox event and acknowledges it once the attempt finishes."""
+    await send_webhook_notification(
+        get_webhook_url(),
+        fields.get("job_id", ""),
+        fields.get("status", ""),
+        fields.get("message", ""),
+    )
+    await redis.xack(WEBHOOK_OUTBOX_STREAM, CONSUMER_GROUP, message_id)